@@ -0,0 +1,38 @@
+#
+# This source file is part of the EdgeDB open source project.
+#
+# Copyright 2020-present MagicStack Inc. and the EdgeDB authors.
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#     http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+#
+
+
+"""Parser table generation used by setup.py.
+
+This lives in an importable module (rather than in setup.py itself)
+so that it can be pickled by reference and run in worker processes:
+under PEP 517 builds setup.py is exec'd and its functions are not
+reachable through ``__main__``.
+"""
+
+
+from __future__ import annotations
+
+import importlib
+
+
+def build_spec(spec_name: str, pickle_file: str) -> None:
+    import parsing
+
+    spec = importlib.import_module(spec_name)
+    parsing.Spec(spec, pickleFile=pickle_file, verbose=True)
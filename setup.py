@@ -18,16 +18,26 @@
 
 
 import binascii
+import concurrent.futures
+import contextlib
+import functools
+import hashlib
+import multiprocessing
 import os
 import os.path
 import pathlib
 import platform
+import py_compile
 import shutil
 import subprocess
+import sys
+import sysconfig
+import tempfile
 import textwrap
 
 import distutils
 from distutils import version
+from distutils import errors as distutils_errors
 from distutils import extension as distutils_extension
 from distutils.command import build as distutils_build
 from distutils.command import build_ext as distutils_build_ext
@@ -79,6 +89,11 @@ RUST_VERSION = '1.42.0'  # Also update docs/internal/dev.rst
 
 EDGEDBCLI_REPO = 'https://github.com/edgedb/edgedb-cli'
 
+# Subdirectory of build_temp used as CARGO_TARGET_DIR by both the CLI
+# and the Rust extensions, so that common dependency crates are only
+# compiled once.
+CARGO_TARGET_SUBDIR = 'rust'
+
 EXTRA_DEPS = {
     'test': [
         # Depend on unreleased version for Python 3.8 support,
@@ -96,9 +111,23 @@ EXTRA_DEPS = {
     'docs': DOCS_DEPS,
 }
 
-EXT_CFLAGS = ['-O2']
+if os.environ.get('EDGEDB_DEBUG'):
+    # Debug builds are meant for fast iteration, so skip the
+    # (expensive) optimization of Cython-generated code.
+    EXT_CFLAGS = ['-O0']
+else:
+    EXT_CFLAGS = ['-O2']
 EXT_LDFLAGS = []
 
+# Extra flags for non-debug builds, applied only if the compiler
+# supports them (see build_ext.build_extensions()).
+EXT_RELEASE_CFLAGS = ['-flto', '-fno-semantic-interposition']
+EXT_RELEASE_LDFLAGS = ['-flto']
+
+if sys.version_info >= (3, 9):
+    # Older Pythons do not mark PyInit_* functions as exported.
+    EXT_RELEASE_CFLAGS.append('-fvisibility=hidden')
+
 ROOT_PATH = pathlib.Path(__file__).parent.resolve()
 
 
@@ -107,24 +136,136 @@ if platform.uname().system != 'Windows':
         '-std=c99', '-fsigned-char', '-Wall', '-Wsign-compare', '-Wconversion'
     ])
 
+# (extension module name, Cython source) pairs.
+EXTENSIONS = [
+    ('edb.testbase.protocol.protocol',
+     'edb/testbase/protocol/protocol.pyx'),
+    ('edb.server.pgproto.pgproto',
+     'edb/server/pgproto/pgproto.pyx'),
+    ('edb.server.dbview.dbview',
+     'edb/server/dbview/dbview.pyx'),
+    ('edb.server.tokenizer',
+     'edb/server/tokenizer.pyx'),
+    ('edb.server.mng_port.edgecon',
+     'edb/server/mng_port/edgecon.pyx'),
+    ('edb.server.cache.stmt_cache',
+     'edb/server/cache/stmt_cache.pyx'),
+    ('edb.server.pgcon.pgcon',
+     'edb/server/pgcon/pgcon.pyx'),
+    ('edb.server.http.http',
+     'edb/server/http/http.pyx'),
+    ('edb.server.http_edgeql_port.protocol',
+     'edb/server/http_edgeql_port/protocol.pyx'),
+    ('edb.server.http_graphql_port.protocol',
+     'edb/server/http_graphql_port/protocol.pyx'),
+    ('edb.server.notebook_port.protocol',
+     'edb/server/notebook_port/protocol.pyx'),
+]
+
+
+def _get_cpu_count():
+    # os.cpu_count() ignores CPU affinity (e.g. as set up by
+    # container runtimes), which leads to oversubscription.
+    if hasattr(os, 'sched_getaffinity'):
+        return len(os.sched_getaffinity(0))
+    else:
+        return os.cpu_count() or 1
+
+
+def _get_build_jobs():
+    jobs = os.environ.get('EDGEDB_BUILD_JOBS')
+    if jobs:
+        return max(int(jobs), 1)
+    else:
+        return _get_cpu_count()
+
+
+@functools.lru_cache()
+def _pg_submodule_status():
+    proc = subprocess.run(
+        ['git', 'submodule', 'status', 'postgres'],
+        stdout=subprocess.PIPE, universal_newlines=True, check=True)
+    return proc.stdout
 
-def _compile_parsers(build_lib, inplace=False):
-    import parsing
+
+@functools.lru_cache()
+def _grammar_hash():
+    import edb as _edb
+    from edb.server.buildmeta import hash_dirs
+
+    h = hashlib.sha1(hash_dirs([(
+        os.path.join(_edb.__path__[0], 'edgeql/parser/grammar'),
+        '.py')]))
+
+    # Some of the productions are synthesized by the Nonterm
+    # machinery in edb.common.parsing, so it shapes the parser
+    # tables as well.
+    with open(os.path.join(_edb.__path__[0], 'common/parsing.py'), 'rb') as f:
+        h.update(f.read())
+
+    return h.digest()
+
+
+def _can_use_process_pool():
+    # Worker processes would re-execute this setup.py on platforms
+    # that spawn rather than fork.
+    return multiprocessing.get_start_method() == 'fork'
+
+
+def _compile_parsers(build_lib, build_temp, inplace=False):
+    import pkg_resources
 
     import edb.edgeql.parser.grammar.single as edgeql_spec
     import edb.edgeql.parser.grammar.block as edgeql_spec2
     import edb.edgeql.parser.grammar.sdldocument as schema_spec
+    from edb.tools import build_parsers
+
+    # The parser tables only need to be regenerated when either the
+    # grammar or the parser generator changes.
+    cache_key = '{}-{}'.format(
+        binascii.hexlify(_grammar_hash()).decode(),
+        pkg_resources.get_distribution('parsing').version)
+
+    pickle_paths = []
+    outdated = []
 
     for spec in (edgeql_spec, edgeql_spec2, schema_spec):
         spec_path = pathlib.Path(spec.__file__).parent
         subpath = pathlib.Path(str(spec_path)[len(str(ROOT_PATH)) + 1:])
         pickle_name = spec.__name__.rpartition('.')[2] + '.pickle'
         pickle_path = subpath / pickle_name
+        pickle_paths.append(pickle_path)
         cache = build_lib / pickle_path
+        # Keep the stamps out of build_lib, as everything in there
+        # gets installed.
+        cache_stamp = build_temp / pickle_path.with_suffix('.pickle.hash')
         cache.parent.mkdir(parents=True, exist_ok=True)
-        parsing.Spec(spec, pickleFile=str(cache), verbose=True)
-        if inplace:
-            shutil.copy2(cache, ROOT_PATH / pickle_path)
+        cache_stamp.parent.mkdir(parents=True, exist_ok=True)
+        if (not cache.exists() or not cache_stamp.exists()
+                or cache_stamp.read_text() != cache_key):
+            outdated.append((spec.__name__, cache, cache_stamp))
+
+    # The specs are independent of each other, so generate them
+    # concurrently.
+    jobs = min(_get_build_jobs(), len(outdated))
+    if jobs > 1 and _can_use_process_pool():
+        with concurrent.futures.ProcessPoolExecutor(jobs) as pool:
+            futures = {
+                pool.submit(build_parsers.build_spec, spec_name, str(cache)):
+                    cache_stamp
+                for spec_name, cache, cache_stamp in outdated
+            }
+            for future in concurrent.futures.as_completed(futures):
+                future.result()
+                futures[future].write_text(cache_key)
+    else:
+        for spec_name, cache, cache_stamp in outdated:
+            build_parsers.build_spec(spec_name, str(cache))
+            cache_stamp.write_text(cache_key)
+
+    if inplace:
+        for pickle_path in pickle_paths:
+            shutil.copy2(build_lib / pickle_path, ROOT_PATH / pickle_path)
 
 
 def _compile_build_meta(build_lib, version, pg_config, runstatedir,
@@ -141,7 +282,7 @@ def _compile_build_meta(build_lib, version, pg_config, runstatedir,
         vertuple[4] = tuple(version_suffix.split('.'))
     vertuple = tuple(vertuple)
 
-    content = textwrap.dedent('''\
+    template = textwrap.dedent('''\
         #
         # This source file is part of the EdgeDB open source project.
         #
@@ -151,45 +292,86 @@ def _compile_build_meta(build_lib, version, pg_config, runstatedir,
         #
         # THIS FILE HAS BEEN AUTOMATICALLY GENERATED.
         #
+        # BUILD_HASH: {build_hash}
+        #
 
         PG_CONFIG_PATH = {pg_config!r}
         RUNSTATE_DIR = {runstatedir!r}
         SHARED_DATA_DIR = {shared_dir!r}
         VERSION = {version!r}
-    ''').format(
+    ''')
+
+    build_hash = hashlib.sha256(repr(
+        (template, vertuple, pg_config, runstatedir, shared_dir)
+    ).encode()).hexdigest()
+
+    directory = build_lib / 'edb' / 'server'
+    if not directory.exists():
+        directory.mkdir(parents=True)
+
+    # Avoid rewriting the file if nothing has changed so that its
+    # mtime (and hence the cached bytecode) stays valid.
+    buildmeta_path = directory / '_buildmeta.py'
+    if buildmeta_path.exists():
+        with open(buildmeta_path, 'rt') as f:
+            for line in f:
+                if line.startswith('# BUILD_HASH: '):
+                    if line[len('# BUILD_HASH: '):].strip() == build_hash:
+                        return
+                    break
+
+    content = template.format(
+        build_hash=build_hash,
         version=vertuple,
         pg_config=pg_config,
         runstatedir=runstatedir,
         shared_dir=shared_dir,
     )
 
-    directory = build_lib / 'edb' / 'server'
-    if not directory.exists():
-        directory.mkdir(parents=True)
-
-    with open(directory / '_buildmeta.py', 'w+t') as f:
+    with open(buildmeta_path, 'w+t') as f:
         f.write(content)
 
+    # _buildmeta is imported on every server start.
+    py_compile.compile(str(buildmeta_path), doraise=True)
+
 
 def _compile_postgres(build_base, *,
                       force_build=False, fresh_build=True,
-                      run_configure=True, build_contrib=True):
-
-    proc = subprocess.run(
-        ['git', 'submodule', 'status', 'postgres'],
-        stdout=subprocess.PIPE, universal_newlines=True, check=True)
-    status = proc.stdout
-    if status[0] == '-':
+                      run_configure=False, build_contrib=True):
+    """Build and install Postgres into *build_base*/postgres.
+
+    ./configure is run when explicitly requested with *run_configure*,
+    when the build tree has not been configured yet, or when the
+    configure arguments differ from those recorded in configure.stamp.
+    A change of the source revision alone does not trigger it: the
+    Postgres makefiles rerun ``config.status --recheck`` themselves
+    whenever ``configure`` changes.
+
+    *fresh_build* cleans the build tree and removes the install tree,
+    but reuses the configure results (set EDGEDB_POSTGRES_FRESH_WIPE
+    to remove those as well).
+    """
+
+    if not (ROOT_PATH / '.git').exists():
         print(
-            'postgres submodule not initialized, '
-            'run `git submodule init; git submodule update`')
+            'postgres can only be built from a git checkout, '
+            'with the postgres submodule initialized')
         exit(1)
 
-    proc = subprocess.run(
-        ['git', 'submodule', 'status', 'postgres'],
-        stdout=subprocess.PIPE, universal_newlines=True, check=True)
-    revision, _, _ = proc.stdout[1:].partition(' ')
-    source_stamp = proc.stdout[0] + revision
+    status = _pg_submodule_status()
+    if status[0] == '-':
+        # Only the pinned revision is needed to build, so avoid
+        # fetching the entire Postgres history.
+        subprocess.run(
+            ['git', 'submodule', 'update', '--init', '--depth=1',
+             'postgres'],
+            check=True)
+
+        _pg_submodule_status.cache_clear()
+        status = _pg_submodule_status()
+
+    revision, _, _ = status[1:].partition(' ')
+    source_stamp = status[0] + revision
 
     postgres_build = (build_base / 'postgres').resolve()
     postgres_src = ROOT_PATH / 'postgres'
@@ -212,45 +394,96 @@ def _compile_postgres(build_base, *,
         else:
             raise NotImplementedError('unsupported system: {}'.format(system))
 
-        if fresh_build and postgres_build.exists():
-            shutil.rmtree(postgres_build)
         build_dir = postgres_build / 'build'
+        if fresh_build and postgres_build.exists():
+            if os.environ.get('EDGEDB_POSTGRES_FRESH_WIPE'):
+                shutil.rmtree(postgres_build)
+            else:
+                # Keep the configure results, so that ./configure
+                # does not have to run again, but make sure that no
+                # build products or installed files from the previous
+                # build survive.
+                if (build_dir / 'GNUmakefile').exists():
+                    subprocess.run(
+                        ['make', 'MAKELEVEL=0', 'clean'],
+                        cwd=str(build_dir), check=False)
+                if (postgres_build / 'install').exists():
+                    shutil.rmtree(postgres_build / 'install')
+                if postgres_build_stamp.exists():
+                    postgres_build_stamp.unlink()
         if not build_dir.exists():
             build_dir.mkdir(parents=True)
 
-        if run_configure or fresh_build or is_outdated:
-            subprocess.run([
-                str(postgres_src / 'configure'),
-                '--prefix=' + str(postgres_build / 'install'),
-                '--with-uuid=' + uuidlib,
-            ], check=True, cwd=str(build_dir))
+        configure_args = [
+            str(postgres_src / 'configure'),
+            '--prefix=' + str(postgres_build / 'install'),
+            '--with-uuid=' + uuidlib,
+        ]
+        configure_stamp = '\n'.join(configure_args)
+        configure_stamp_path = postgres_build / 'configure.stamp'
 
-        subprocess.run(
-            ['make', 'MAKELEVEL=0', '-j', str(max(os.cpu_count() - 1, 1))],
-            cwd=str(build_dir), check=True)
+        if configure_stamp_path.exists():
+            with open(configure_stamp_path, 'r') as f:
+                configured_with = f.read()
+        else:
+            configured_with = None
+
+        is_configured = (
+            configured_with == configure_stamp
+            and (build_dir / 'GNUmakefile').exists()
+        )
+
+        if run_configure or not is_configured:
+            subprocess.run(configure_args, check=True, cwd=str(build_dir))
 
-        if build_contrib or fresh_build or is_outdated:
+            with open(configure_stamp_path, 'w') as f:
+                f.write(configure_stamp)
+
+        build_contrib = build_contrib or fresh_build or is_outdated
+        make_jobs = str(max(_get_cpu_count() - 1, 1))
+
+        # world-bin builds core and contrib within a single make
+        # invocation, which keeps all cores busy across both.  Older
+        # Postgres source trees do not have this target.
+        with open(postgres_src / 'GNUmakefile.in', 'r') as f:
+            has_world_bin = 'world-bin' in f.read()
+
+        if build_contrib and has_world_bin:
             subprocess.run(
-                [
-                    'make', '-C', 'contrib', 'MAKELEVEL=0', '-j',
-                    str(max(os.cpu_count() - 1, 1))
-                ],
+                ['make', 'MAKELEVEL=0', '-j', make_jobs, 'world-bin'],
                 cwd=str(build_dir), check=True)
 
-        subprocess.run(
-            ['make', 'MAKELEVEL=0', 'install'],
-            cwd=str(build_dir), check=True)
+            subprocess.run(
+                ['make', 'MAKELEVEL=0', 'install-world-bin'],
+                cwd=str(build_dir), check=True)
+        else:
+            subprocess.run(
+                ['make', 'MAKELEVEL=0', '-j', make_jobs],
+                cwd=str(build_dir), check=True)
+
+            if build_contrib:
+                subprocess.run(
+                    ['make', '-C', 'contrib', 'MAKELEVEL=0', '-j', make_jobs],
+                    cwd=str(build_dir), check=True)
 
-        if build_contrib or fresh_build or is_outdated:
             subprocess.run(
-                ['make', '-C', 'contrib', 'MAKELEVEL=0', 'install'],
+                ['make', 'MAKELEVEL=0', 'install'],
                 cwd=str(build_dir), check=True)
 
+            if build_contrib:
+                subprocess.run(
+                    ['make', '-C', 'contrib', 'MAKELEVEL=0', 'install'],
+                    cwd=str(build_dir), check=True)
+
         with open(postgres_build_stamp, 'w') as f:
             f.write(source_stamp)
 
 
+@functools.lru_cache()
 def _check_rust():
+    if os.environ.get('EDGEDB_SKIP_RUSTC_CHECK'):
+        return
+
     try:
         ver = subprocess.check_output(["rustc", '-V']).split()[1]
         ver = version.LooseVersion(ver.decode())
@@ -264,6 +497,49 @@ def _check_rust():
             f'edgedb from source (see https://rustup.rs/)')
 
 
+@contextlib.contextmanager
+def _use_ccache():
+    # Only wrap the compiler for the duration of the distutils
+    # build, so that e.g. the Postgres build and cargo do not
+    # inherit the modified environment.
+    if not shutil.which('ccache'):
+        yield
+        return
+
+    saved_env = {
+        var: os.environ.get(var)
+        for var in ('CC', 'CXX', 'CCACHE_COMPILERCHECK')
+    }
+
+    for var, default in (('CC', 'cc'), ('CXX', 'c++')):
+        compiler = (os.environ.get(var)
+                    or sysconfig.get_config_var(var) or default)
+        if not compiler.startswith('ccache'):
+            os.environ[var] = f'ccache {compiler}'
+
+    # Compare compilers by content rather than mtime to avoid
+    # spurious cache misses after a toolchain reinstall.
+    os.environ.setdefault('CCACHE_COMPILERCHECK', 'content')
+
+    try:
+        yield
+    finally:
+        for var, value in saved_env.items():
+            if value is None:
+                os.environ.pop(var, None)
+            else:
+                os.environ[var] = value
+
+
+def _link_or_copy(src, dst):
+    # Hardlinking is O(1), fall back to copying if src and dst
+    # are on different filesystems or links are not supported.
+    try:
+        os.link(src, dst)
+    except OSError:
+        shutil.copyfile(src, dst)
+
+
 class build(distutils_build.build):
 
     user_options = distutils_build.build.user_options + [
@@ -286,7 +562,7 @@ class build(distutils_build.build):
     def run(self, *args, **kwargs):
         super().run(*args, **kwargs)
         build_lib = pathlib.Path(self.build_lib)
-        _compile_parsers(build_lib)
+        _compile_parsers(build_lib, pathlib.Path(self.build_temp))
         if self.pg_config:
             _compile_build_meta(
                 build_lib,
@@ -303,27 +579,70 @@ class develop(setuptools_develop.develop):
     def run(self, *args, **kwargs):
         _check_rust()
         build = self.get_finalized_command('build')
-        rust_tmp = pathlib.Path(build.build_temp) / 'rust' / 'cli'
+        rust_tmp = pathlib.Path(build.build_temp) / CARGO_TARGET_SUBDIR
         build_base = pathlib.Path(build.build_base).resolve()
         rust_root = build_base / 'cli'
         env = dict(os.environ)
         env['CARGO_TARGET_DIR'] = str(rust_tmp)
+        env.setdefault('CARGO_BUILD_JOBS', str(_get_build_jobs()))
         env['PSQL_DEFAULT_PATH'] = build_base / 'postgres' / 'install' / 'bin'
 
-        subprocess.run(
-            [
-                'cargo', 'install',
-                '--verbose', '--verbose',
-                '--git', EDGEDBCLI_REPO,
-                '--bin', 'edgedb',
-                '--root', rust_root,
-                '--features=dev_mode',
-                '--locked',
-                '--debug',
-            ],
-            env=env,
-            check=True,
-        )
+        cargo_offline = bool(os.environ.get('EDGEDB_CARGO_OFFLINE'))
+
+        # Querying the remote HEAD is much cheaper than letting
+        # cargo refetch and relink the CLI when nothing has changed.
+        if cargo_offline:
+            proc = None
+        else:
+            proc = subprocess.run(
+                ['git', 'ls-remote', EDGEDBCLI_REPO, 'HEAD'],
+                stdout=subprocess.PIPE, universal_newlines=True)
+        if proc is not None and proc.returncode == 0 and proc.stdout:
+            cli_revision, _, _ = proc.stdout.partition('\t')
+        else:
+            cli_revision = None
+
+        cargo_args = [
+            'cargo', 'install',
+            '--verbose', '--verbose',
+            '--git', EDGEDBCLI_REPO,
+            '--bin', 'edgedb',
+            '--root', str(rust_root),
+            '--features=dev_mode',
+            '--locked',
+            '--debug',
+        ]
+
+        # The binary also depends on how it is built, not just on
+        # the revision.  --jobs and --offline do not affect the
+        # result, so they are not part of the stamp.
+        if cli_revision is not None:
+            cli_stamp = '\n'.join(
+                [cli_revision, str(env['PSQL_DEFAULT_PATH'])] + cargo_args)
+        else:
+            cli_stamp = None
+
+        cli_stamp_path = rust_root / 'edgedb.stamp'
+        if cli_stamp_path.exists():
+            with open(cli_stamp_path, 'r') as f:
+                installed_stamp = f.read()
+        else:
+            installed_stamp = None
+
+        if (cli_stamp is not None and cli_stamp == installed_stamp
+                and (rust_root / 'bin' / 'edgedb').exists()):
+            distutils.log.info(
+                'edgedb CLI is up to date, skipping cargo install')
+        else:
+            cargo_args += ['--jobs', env['CARGO_BUILD_JOBS']]
+            if cargo_offline:
+                cargo_args.append('--offline')
+
+            subprocess.run(cargo_args, env=env, check=True)
+
+            if cli_stamp is not None:
+                with open(cli_stamp_path, 'w') as f:
+                    f.write(cli_stamp)
 
         shutil.copy(
             rust_root / 'bin' / 'edgedb',
@@ -341,7 +660,8 @@ class develop(setuptools_develop.develop):
 
         super().run(*args, **kwargs)
 
-        _compile_parsers(build_base / 'lib', inplace=True)
+        _compile_parsers(
+            build_base / 'lib', pathlib.Path(build.build_temp), inplace=True)
         _compile_postgres(build_base)
 
 
@@ -351,17 +671,8 @@ class gen_build_cache_key(setuptools.Command):
     user_options = []
 
     def run(self, *args, **kwargs):
-        import edb as _edb
-        from edb.server.buildmeta import hash_dirs
-
-        parser_hash = hash_dirs([(
-            os.path.join(_edb.__path__[0], 'edgeql/parser/grammar'),
-            '.py')])
-
-        proc = subprocess.run(
-            ['git', 'submodule', 'status', 'postgres'],
-            stdout=subprocess.PIPE, universal_newlines=True, check=True)
-        postgres_revision, _, _ = proc.stdout[1:].partition(' ')
+        parser_hash = _grammar_hash()
+        postgres_revision, _, _ = _pg_submodule_status()[1:].partition(' ')
 
         print(f'{binascii.hexlify(parser_hash).decode()}-{postgres_revision}')
 
@@ -377,7 +688,7 @@ class build_postgres(setuptools.Command):
     description = "build postgres"
 
     user_options = [
-        ('configure', None, 'run ./configure'),
+        ('configure', None, 'run ./configure even if already configured'),
         ('build-contrib', None, 'build contrib'),
         ('fresh-build', None, 'rebuild from scratch'),
     ]
@@ -473,14 +784,75 @@ class build_ext(distutils_build_ext.build_ext):
 
                 directives[k] = v
 
-        self.distribution.ext_modules[:] = cythonize(
-            self.distribution.ext_modules,
+        # Parallel cythonization relies on a multiprocessing pool.
+        nthreads = _get_build_jobs()
+        if nthreads == 1 or not _can_use_process_pool():
+            nthreads = 0
+
+        # No build_dir is passed on purpose: the generated .c files
+        # are kept next to their .pyx sources, so they survive wiping
+        # the build directory and cythonize() only regenerates them
+        # when a .pyx (or one of its .pxd dependencies) changes.
+        cythonize_kwargs = dict(
             compiler_directives=directives,
             annotate=self.cython_annotate,
-            include_path=["edb/server/pgproto/"])
+            include_path=["edb/server/pgproto/"],
+        )
+
+        try:
+            self.distribution.ext_modules[:] = cythonize(
+                self.distribution.ext_modules,
+                nthreads=nthreads,
+                **cythonize_kwargs)
+        except OSError:
+            if not nthreads:
+                raise
+            # Process pool could not be created, fall back to
+            # serial cythonization.
+            self.distribution.ext_modules[:] = cythonize(
+                self.distribution.ext_modules,
+                **cythonize_kwargs)
 
         super(build_ext, self).finalize_options()
 
+        # Compile extensions in parallel unless -j was given explicitly
+        # to either build or build_ext.
+        if self.parallel is None:
+            self.parallel = _get_build_jobs()
+
+    def build_extensions(self):
+        if (not self.debug and self.compiler.compiler_type == 'unix'
+                and self._compiler_supports(
+                    EXT_RELEASE_CFLAGS, EXT_RELEASE_LDFLAGS)):
+            for ext in self.extensions:
+                for flag in EXT_RELEASE_CFLAGS:
+                    if flag not in ext.extra_compile_args:
+                        ext.extra_compile_args.append(flag)
+                for flag in EXT_RELEASE_LDFLAGS:
+                    if flag not in ext.extra_link_args:
+                        ext.extra_link_args.append(flag)
+
+        super().build_extensions()
+
+    def _compiler_supports(self, cflags, ldflags):
+        # Flags like -flto are usually accepted by the compiler, but
+        # fail at link time if the linker lacks LTO support, so check
+        # both steps.
+        with tempfile.TemporaryDirectory() as tmpdir:
+            src = pathlib.Path(tmpdir) / 'flagcheck.c'
+            with open(src, 'w') as f:
+                f.write('int flagcheck(void) { return 0; }\n')
+            try:
+                objects = self.compiler.compile(
+                    [str(src)], output_dir=tmpdir, extra_postargs=cflags)
+                self.compiler.link_shared_object(
+                    objects, 'flagcheck.so', output_dir=tmpdir,
+                    extra_postargs=ldflags)
+            except (distutils_errors.CompileError,
+                    distutils_errors.LinkError):
+                return False
+        return True
+
     def run(self):
         if self.distribution.rust_extensions:
             distutils.log.info("running build_rust")
@@ -506,18 +878,25 @@ class build_ext(distutils_build_ext.build_ext):
                     # bad things will happen.
                     if target_path.exists():
                         target_path.unlink()
+                    # The same applies to the build copy, as it might
+                    # share an inode with the in-place module (see
+                    # _link_or_copy()).
+                    if dylib_path.exists():
+                        dylib_path.unlink()
 
                     target_path.parent.mkdir(parents=True, exist_ok=True)
 
             build_rust.debug = self.debug
             os.environ['CARGO_TARGET_DIR'] = (
-                str(pathlib.Path(self.build_temp) / 'rust' / 'extensions'))
+                str(pathlib.Path(self.build_temp) / CARGO_TARGET_SUBDIR))
+            os.environ.setdefault('CARGO_BUILD_JOBS', str(_get_build_jobs()))
             build_rust.run()
 
             for src, dst in copy_list:
-                shutil.copyfile(src, dst)
+                _link_or_copy(src, dst)
 
-        super().run()
+        with _use_ccache():
+            super().run()
 
 
 if setuptools_rust is not None:
@@ -562,70 +941,10 @@ setuptools.setup(
     },
     ext_modules=[
         distutils_extension.Extension(
-            "edb.testbase.protocol.protocol",
-            ["edb/testbase/protocol/protocol.pyx"],
-            extra_compile_args=EXT_CFLAGS,
-            extra_link_args=EXT_LDFLAGS),
-
-        distutils_extension.Extension(
-            "edb.server.pgproto.pgproto",
-            ["edb/server/pgproto/pgproto.pyx"],
-            extra_compile_args=EXT_CFLAGS,
-            extra_link_args=EXT_LDFLAGS),
-
-        distutils_extension.Extension(
-            "edb.server.dbview.dbview",
-            ["edb/server/dbview/dbview.pyx"],
-            extra_compile_args=EXT_CFLAGS,
-            extra_link_args=EXT_LDFLAGS),
-
-        distutils_extension.Extension(
-            "edb.server.tokenizer",
-            ["edb/server/tokenizer.pyx"],
-            extra_compile_args=EXT_CFLAGS,
-            extra_link_args=EXT_LDFLAGS),
-
-        distutils_extension.Extension(
-            "edb.server.mng_port.edgecon",
-            ["edb/server/mng_port/edgecon.pyx"],
-            extra_compile_args=EXT_CFLAGS,
-            extra_link_args=EXT_LDFLAGS),
-
-        distutils_extension.Extension(
-            "edb.server.cache.stmt_cache",
-            ["edb/server/cache/stmt_cache.pyx"],
-            extra_compile_args=EXT_CFLAGS,
-            extra_link_args=EXT_LDFLAGS),
-
-        distutils_extension.Extension(
-            "edb.server.pgcon.pgcon",
-            ["edb/server/pgcon/pgcon.pyx"],
-            extra_compile_args=EXT_CFLAGS,
-            extra_link_args=EXT_LDFLAGS),
-
-        distutils_extension.Extension(
-            "edb.server.http.http",
-            ["edb/server/http/http.pyx"],
-            extra_compile_args=EXT_CFLAGS,
-            extra_link_args=EXT_LDFLAGS),
-
-        distutils_extension.Extension(
-            "edb.server.http_edgeql_port.protocol",
-            ["edb/server/http_edgeql_port/protocol.pyx"],
-            extra_compile_args=EXT_CFLAGS,
-            extra_link_args=EXT_LDFLAGS),
-
-        distutils_extension.Extension(
-            "edb.server.http_graphql_port.protocol",
-            ["edb/server/http_graphql_port/protocol.pyx"],
-            extra_compile_args=EXT_CFLAGS,
-            extra_link_args=EXT_LDFLAGS),
-
-        distutils_extension.Extension(
-            "edb.server.notebook_port.protocol",
-            ["edb/server/notebook_port/protocol.pyx"],
-            extra_compile_args=EXT_CFLAGS,
-            extra_link_args=EXT_LDFLAGS),
+            name, [source],
+            extra_compile_args=list(EXT_CFLAGS),
+            extra_link_args=list(EXT_LDFLAGS))
+        for name, source in EXTENSIONS
     ],
     rust_extensions=rust_extensions,
     install_requires=RUNTIME_DEPS,